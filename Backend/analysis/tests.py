@@ -1,3 +1,344 @@
-from django.test import TestCase
+import io
+import os
+import copy
+import json
+import math
+import pickle
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+import reviews
+import sampling
+import storage
+from reviews import Review
+
+
+def processed_review(**overrides):
+    review = {
+        'score': '9.0',
+        'title': 'Lovely stay',
+        'date': 'March 2024',
+        'user_name': 'Asha',
+        'user_country': 'India',
+        'text': 'The staff were very helpful.',
+        'lang': 'en',
+        'sentiment': 'POSITIVE',
+        'sentiment_scores': {'Positive': 0.9, 'Negative': 0.02, 'Neutral': 0.07, 'Mixed': 0.01},
+        'key_phrases': ['The staff'],
+    }
+    review.update(overrides)
+    return review
+
+
+class ReviewRoundTripTests(SimpleTestCase):
+    def assertRoundTrips(self, data):
+        review = Review.from_dict(data)
+        self.assertEqual(review.to_dict(), data)
+        self.assertEqual(json.loads(json.dumps(review.to_dict())), data)
+        return review
+
+    def test_processed_review(self):
+        review = self.assertRoundTrips(processed_review())
+        self.assertEqual(review['sentiment_scores']['Positive'], 0.9)
+        self.assertEqual(review['key_phrases'], ('The staff',))
+
+    def test_missing_fields_stay_missing(self):
+        data = {'score': '7.0', 'date': 'May 2023', 'text': 'Fine.'}
+        review = self.assertRoundTrips(data)
+        self.assertNotIn('sentiment', review)
+        self.assertIsNone(review.get('sentiment'))
+        self.assertEqual(review.get('lang', ''), '')
+        with self.assertRaises(KeyError):
+            review['key_phrases']
+
+    def test_none_values_are_kept(self):
+        self.assertRoundTrips(processed_review(sentiment_scores=None, user_country=None))
+
+    def test_integer_sentiment_scores(self):
+        scores = {'Positive': 1, 'Negative': 0, 'Neutral': 0, 'Mixed': 0}
+        review = self.assertRoundTrips(processed_review(sentiment_scores=scores))
+        self.assertIs(type(review.to_dict()['sentiment_scores']['Positive']), int)
+
+    def test_non_standard_sentiment_scores(self):
+        self.assertRoundTrips(processed_review(sentiment_scores={'Positive': 0.5, 'Negative': 0.5}))
+        self.assertRoundTrips(processed_review(
+            sentiment_scores={'Negative': 0.1, 'Positive': 0.7, 'Neutral': 0.1, 'Mixed': 0.1}))
+        self.assertRoundTrips(processed_review(sentiment_scores=[0.25, 0.25, 0.25, 0.25]))
+
+    def test_extra_keys(self):
+        review = self.assertRoundTrips(processed_review(hotel_reply='Thank you!', helpful=3))
+        self.assertEqual(review['hotel_reply'], 'Thank you!')
+        self.assertIn('helpful', review)
+
+    def test_packed_sentiment_scores_are_read_only(self):
+        review = Review.from_dict(processed_review())
+        with self.assertRaises(TypeError):
+            review['sentiment_scores']['Positive'] = 0.5
+
+        # Copying the scores onto another review keeps them packed
+        other = Review(score='8.0', date='June 2024', text='Nice.')
+        other['sentiment_scores'] = review['sentiment_scores']
+        self.assertEqual(other.to_dict()['sentiment_scores'], processed_review()['sentiment_scores'])
+        json.dumps(other.to_dict())
+
+    def test_pickle_and_copy(self):
+        data = {'score': '7.0', 'date': 'May 2023', 'text': 'Fine.', 'extra_field': [1, 2]}
+        for review in (Review.from_dict(data), Review.from_dict(processed_review())):
+            for clone in (pickle.loads(pickle.dumps(review)), copy.copy(review), copy.deepcopy(review)):
+                self.assertEqual(clone.to_dict(), review.to_dict())
+        self.assertNotIn('sentiment', pickle.loads(pickle.dumps(Review.from_dict(data))))
+
+    def test_interned_fields_share_strings(self):
+        a = Review.from_dict(json.loads(json.dumps(processed_review())))
+        b = Review.from_dict(json.loads(json.dumps(processed_review())))
+        self.assertIs(a['date'], b['date'])
+        self.assertIs(a['key_phrases'][0], b['key_phrases'][0])
+
+
+class ReviewLoadTests(SimpleTestCase):
+    def test_load_raw_file_with_metadata(self):
+        raw = {
+            'metadata': {'url': 'https://www.booking.com/hotel/in/x.html', 'title': 'X', 'address': '', 'description': ''},
+            'reviews': [
+                {'score': '9.0', 'title': 'Great', 'date': 'March 2024', 'user_name': 'A',
+                 'user_country': 'India', 'text': 'Great stay.', 'lang': 'en'},
+                {'score': '4.0', 'title': 'Poor', 'date': 'April 2024', 'user_name': 'B',
+                 'user_country': 'France', 'text': 'Noisy room.', 'lang': 'en'},
+            ],
+        }
+        data = reviews.load(io.StringIO(json.dumps(raw)))
+        self.assertEqual(data['metadata'], raw['metadata'])
+        self.assertIsInstance(data['metadata'], dict)
+        self.assertTrue(all(isinstance(r, Review) for r in data['reviews']))
+        self.assertEqual(reviews.reviews_to_dicts(data['reviews']), raw['reviews'])
+
+    def test_load_and_count_processed_file(self):
+        items = [processed_review(text=f"Review {i}") for i in range(5)]
+        text = json.dumps(items)
+        loaded = reviews.load(io.StringIO(text))
+        self.assertEqual(reviews.reviews_to_dicts(loaded), items)
+        self.assertEqual(reviews.count(io.StringIO(text)), 5)
+
+
+def sample_review(date, score, **fields):
+    return dict({'date': date, 'score': score, 'text': f"{date} {score}"}, **fields)
+
+
+class StratifiedSampleDrawTests(SimpleTestCase):
+    def setUp(self):
+        # Two months x two score bands, strata of very different sizes
+        self.reviews = (
+            [sample_review('March 2024', '9.0', n=i) for i in range(40)]
+            + [sample_review('March 2024', '3.0', n=i) for i in range(4)]
+            + [sample_review('April 2024', '9.0', n=i) for i in range(20)]
+            + [sample_review('April 2024', '6.0', n=i) for i in range(1)]
+        )
+
+    def test_floor_reaches_every_stratum_first(self):
+        sample = sampling.StratifiedSample(self.reviews)
+        self.assertEqual(len(sample.keys), 4)
+
+        sample.draw(3)
+        self.assertEqual(sorted(sample.drawn.values()), [0, 1, 1, 1])
+        sample.draw(4)
+        # Second round of the floor; the single-review stratum stays at one
+        self.assertEqual(sorted(sample.drawn.values()), [1, 2, 2, 2])
+
+    def test_proportional_allocation_after_floor(self):
+        sample = sampling.StratifiedSample(self.reviews)
+        sample.draw(30)
+        drawn = {key: sample.drawn[key] for key in sample.keys}
+        self.assertEqual(drawn[('2024-03', 'high')], max(drawn.values()))
+        self.assertGreater(drawn[('2024-03', 'high')], drawn[('2024-04', 'high')])
+        self.assertEqual(sample.size, 30)
+
+    def test_draw_until_exhausted(self):
+        sample = sampling.StratifiedSample(self.reviews)
+        drawn = sample.draw(1000)
+        self.assertTrue(sample.exhausted)
+        self.assertEqual(len(drawn), len(self.reviews))
+        self.assertEqual(sample.draw(10), [])
+
+    def test_granularity_collapses_to_fit_budget(self):
+        months = ['January', 'February', 'March', 'April', 'May', 'June',
+                  'July', 'August', 'September', 'October', 'November', 'December']
+        many = [sample_review(f"{month} {year}", '9.0') for year in (2023, 2024) for month in months]
+        self.assertEqual(sampling.StratifiedSample(many, budget=48).granularity, 'month')
+        self.assertEqual(sampling.StratifiedSample(many, budget=16).granularity, 'quarter')
+        self.assertEqual(sampling.StratifiedSample(many, budget=4).granularity, 'year')
+        self.assertEqual(sampling.StratifiedSample(many, budget=2).granularity, 'none')
+        self.assertEqual(sampling.StratifiedSample(many).granularity, 'month')
+
+    def test_unparseable_date_and_score(self):
+        sample = sampling.StratifiedSample([sample_review('sometime', 'n/a'), sample_review('May 2024', None)])
+        self.assertEqual(sample.keys, [('2024-05', 'unknown'), ('unknown', 'unknown')])
+
+    def test_seeded_redraw_is_deterministic(self):
+        first = sampling.StratifiedSample(self.reviews, seed=7, budget=20)
+        in_steps = first.draw(5) + first.draw(12) + first.draw(20)
+
+        again = sampling.StratifiedSample(list(self.reviews), seed=7, budget=20)
+        self.assertEqual(again.draw(37), in_steps)
+
+        other_seed = sampling.StratifiedSample(self.reviews, seed=8, budget=20)
+        self.assertNotEqual(other_seed.draw(37), in_steps)
+
+
+class StratifiedSampleEstimateTests(SimpleTestCase):
+    @staticmethod
+    def positive(review):
+        return review.get('positive', False)
+
+    def test_no_sample(self):
+        sample = sampling.StratifiedSample([sample_review('May 2024', '9.0')])
+        self.assertEqual(sample.estimate_share(self.positive), (0.0, 1.0))
+
+    def test_full_sample_is_exact(self):
+        population = [sample_review('May 2024', '9.0', positive=i < 30) for i in range(100)]
+        sample = sampling.StratifiedSample(population)
+        sample.draw(100)
+        share, margin = sample.estimate_share(self.positive)
+        self.assertAlmostEqual(share, 0.3)
+        self.assertEqual(margin, 0.0)
+
+    def test_finite_population_correction(self):
+        population = [sample_review('May 2024', '9.0', positive=i % 2 == 0) for i in range(100)]
+        sample = sampling.StratifiedSample(population)
+        sample.draw(50)
+        share, margin = sample.estimate_share(self.positive)
+
+        n, N = 50, 100
+        p = sum(1 for r in sample.reviews() if self.positive(r)) / n
+        s2 = p * (1 - p) * n / (n - 1)
+        self.assertAlmostEqual(share, p)
+        self.assertAlmostEqual(margin, sampling.Z_95 * math.sqrt((1 - n / N) * s2 / n))
+
+    def test_strata_are_weighted_by_size(self):
+        # 80 high-score reviews all positive, 20 low-score reviews none positive
+        population = (
+            [sample_review('May 2024', '9.0', positive=True) for _ in range(80)]
+            + [sample_review('May 2024', '2.0', positive=False) for _ in range(20)]
+        )
+        sample = sampling.StratifiedSample(population)
+        sample.draw(10)
+        share, margin = sample.estimate_share(self.positive)
+        self.assertAlmostEqual(share, 0.8)
+        self.assertAlmostEqual(margin, 0.0)
+
+    def test_unsampled_strata_widen_margin(self):
+        population = (
+            [sample_review('May 2024', '9.0', positive=True) for _ in range(50)]
+            + [sample_review('June 2024', '9.0', positive=True) for _ in range(30)]
+            + [sample_review('July 2024', '9.0', positive=False) for _ in range(20)]
+        )
+        sample = sampling.StratifiedSample(population)
+        sample.draw(1)
+        self.assertEqual(sample.drawn[('2024-05', 'high')], 1)
+
+        share, margin = sample.estimate_share(self.positive)
+        # The unsampled half is imputed with the sampled share (1.0) and
+        # counted against the margin at its worst case
+        self.assertAlmostEqual(share, 1.0)
+        single_stratum = sampling.Z_95 * math.sqrt(0.5 ** 2 * (1 - 1 / 50) * 0.25)
+        self.assertAlmostEqual(margin, min(single_stratum + 0.5 * 1.0, 1.0))
+
+        sample.draw(2)
+        share, margin = sample.estimate_share(self.positive)
+        self.assertAlmostEqual(share, 0.8)
+        self.assertLess(margin, 1.0)
+
+
+class ComprehendStub:
+    def __init__(self):
+        self.documents = []
+
+    def _sentiment(self, text):
+        label = 'NEGATIVE' if 'bad' in text else 'POSITIVE'
+        scores = {'Positive': 0.9, 'Negative': 0.05, 'Neutral': 0.03, 'Mixed': 0.02}
+        if label == 'NEGATIVE':
+            scores = {'Positive': 0.05, 'Negative': 0.9, 'Neutral': 0.03, 'Mixed': 0.02}
+        return {'Sentiment': label, 'SentimentScore': scores}
+
+    def batch_detect_sentiment(self, TextList, LanguageCode):
+        self.documents.extend(TextList)
+        return {'ResultList': [dict(self._sentiment(t), Index=i) for i, t in enumerate(TextList)], 'ErrorList': []}
+
+    def batch_detect_key_phrases(self, TextList, LanguageCode):
+        return {'ResultList': [{'Index': i, 'KeyPhrases': [{'Text': 'the room'}]} for i in range(len(TextList))],
+                'ErrorList': []}
+
+
+class ApproximatePipelineTests(SimpleTestCase):
+    hotel = 'test-hotel'
+
+    def setUp(self):
+        import analyze
+        self.analyze = analyze
+
+        base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base_dir, ignore_errors=True)
+        settings_override = override_settings(BASE_DIR=base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.comprehend = ComprehendStub()
+        for patcher in (mock.patch.object(analyze, 'comprehend', self.comprehend),
+                        mock.patch('wordclouds.submit')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        raw_reviews = [
+            {'score': '9.0' if i % 3 else '3.0', 'title': 'Stay', 'date': f"{month} 2024",
+             'user_name': f"user{i}", 'user_country': 'India', 'lang': 'en',
+             'text': f"Review {i}: the room was {'bad' if i % 4 == 0 else 'lovely'}."}
+            for i, month in enumerate(['March', 'April', 'May'] * 8)
+        ]
+        storage.atomic_write_json(storage.raw_reviews_path(self.hotel),
+                                  {'metadata': {'title': 'Test hotel'}, 'reviews': raw_reviews})
+
+    def run_approximate(self, **kwargs):
+        kwargs.setdefault('target_error', 0.0)
+        kwargs.setdefault('initial_size', 12)
+        kwargs.setdefault('batch_size', 6)
+        return self.analyze.run_pipeline(self.hotel, approximate=True, **kwargs)
+
+    def test_first_pass_publishes_approximate_charts(self):
+        charts = self.run_approximate(max_rounds=0)
+        self.assertEqual(charts['approximate']['sampled'], 12)
+        self.assertEqual(charts['approximate']['total'], 24)
+        self.assertEqual(len(self.comprehend.documents), 12)
+        self.assertFalse(os.path.exists(storage.processed_path(self.hotel)))
+
+        # Resuming redraws the same sample and keeps the current version
+        version = storage.get_current_version(self.hotel)
+        charts = self.run_approximate(max_rounds=0)
+        self.assertEqual(charts['approximate']['sampled'], 12)
+        self.assertEqual(len(self.comprehend.documents), 12)
+        self.assertEqual(storage.get_current_version(self.hotel), version)
+
+    def test_exhausted_sample_publishes_exact_charts(self):
+        charts = self.run_approximate()
+        self.assertNotIn('approximate', charts)
+        self.assertEqual(charts['review_count'], 24)
+        self.assertTrue(os.path.exists(storage.processed_path(self.hotel)))
+
+        # Every review was sent to Comprehend exactly once across rounds
+        self.assertEqual(len(self.comprehend.documents), 24)
+        self.assertEqual(len(set(self.comprehend.documents)), 24)
+
+        processed = self.analyze.load_processed(self.hotel)
+        self.assertEqual(len(processed), 24)
+        self.assertTrue(all('sentiment' in r and 'key_phrases' in r for r in processed))
+
+    def test_stops_once_fully_enriched(self):
+        self.run_approximate(max_rounds=0)
+        self.analyze.run_pipeline(self.hotel)
+        sent = len(self.comprehend.documents)
+        self.assertEqual(sent, 24)
+
+        charts = self.run_approximate()
+        self.assertNotIn('approximate', charts)
+        self.assertEqual(len(self.comprehend.documents), sent)
@@ -5,5 +5,8 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('loading/', views.loading_view, name='loading'),
     path('result/<str:hotel_name>/', views.result, name='result'),
+    path('result/<str:hotel_name>/full/', views.full_analysis, name='full_analysis'),
+    path('wordcloud/<str:hotel_name>/<str:version>/<slug:size>.<slug:fmt>',
+         views.wordcloud_image, name='wordcloud'),
 ]
 
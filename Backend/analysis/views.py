@@ -2,24 +2,29 @@ import os
 import json
 from django.shortcuts import render, redirect
 from django.conf import settings
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST, require_safe
 from scrap import scrape_hotel_reviews
-from analyze import run_pipeline
+from analyze import run_pipeline, count_processed
 from scrap import extract_pagename
+import storage
+import wordclouds
 
 def index(request):
     if request.method == 'POST':
         hotel_url = request.POST.get('hotel_url')
         if hotel_url:
             try:
-                # STEP 1: Scrape hotel reviews
-                scrape_hotel_reviews(hotel_url, max_pages=1)
-
-                # STEP 2: Get hotel name from metadata
+                # STEP 1: Get hotel name from the URL
                 pagename = extract_pagename(hotel_url)
-                hotel_file = f"{pagename}.json"
+                if not storage.is_valid_hotel_name(pagename):
+                    raise ValueError("Could not extract a hotel name from URL")
 
-                # STEP 3: Run analysis
-                run_pipeline(pagename)
+                # STEP 2 + 3: Scrape hotel reviews and run analysis,
+                # unless the hotel has been analyzed already
+                _ensure_analyzed(hotel_url, pagename)
 
                 # STEP 4: Redirect to result
                 return redirect('result', hotel_name=pagename)
@@ -35,46 +40,124 @@ def loading_view(request):
         return redirect('index')
 
     pagename = extract_pagename(hotel_url)
-    processed_file = f'./cache/processed/{pagename}_aws_processed.json'
+    _require_hotel_name(pagename)
+
+    _ensure_analyzed(hotel_url, pagename)
+    return redirect('result', hotel_name=pagename)
+
+
+# Full enrichment of a hotel that only has approximate charts. POST only,
+# since it runs paid Comprehend calls for every review.
+@require_POST
+def full_analysis(request, hotel_name):
+    _require_hotel_name(hotel_name)
+    if not os.path.exists(storage.raw_reviews_path(hotel_name)):
+        raise Http404('Hotel has not been scraped')
+
+    with storage.hotel_lock(hotel_name):
+        if not os.path.exists(storage.processed_path(hotel_name)):
+            run_pipeline(hotel_name)
+
+    return redirect('result', hotel_name=hotel_name)
+
+
+# Hotel names end up in cache paths, so only accept what a pagename can be
+def _require_hotel_name(hotel_name):
+    if not storage.is_valid_hotel_name(hotel_name):
+        raise Http404('Unknown hotel')
+
+
+# Scrape and analyze a hotel unless it has been already. Re-checked under
+# the hotel lock in case another worker finished it while we were waiting.
+# Approximate (sampled) analysis is only run from the command line, see
+# main.py --approximate; the web views always analyze every scraped review.
+def _ensure_analyzed(hotel_url, pagename):
+    if _analysis_ready(pagename):
+        return
+    with storage.hotel_lock(pagename):
+        if not _analysis_ready(pagename):
+            scrape_hotel_reviews(hotel_url, max_pages=settings.SCRAPE_MAX_PAGES)
+            run_pipeline(pagename)
 
-    if os.path.exists(processed_file):
-        # Already processed → skip scraping
-        return redirect('result', hotel_name=pagename)
 
-    # Not processed → run pipeline (scraping + analyze)
-    scrape_hotel_reviews(hotel_url, max_pages=1)
-    charts = run_pipeline(pagename)
-    os.makedirs(f'./cache/charts_json', exist_ok=True)
-    with open(f'./cache/charts_json/{pagename}_charts.json', 'w', encoding='utf-8') as f:
-        json.dump(charts, f)
+# Fully processed, or approximate charts exist
+def _analysis_ready(hotel_name):
+    if os.path.exists(storage.processed_path(hotel_name)):
+        return True
+    return storage.get_current_version(hotel_name) is not None
 
 def result(request, hotel_name):
-    processed_path = os.path.join(settings.BASE_DIR, 'cache', 'processed', f"{hotel_name}_aws_processed.json")
-    charts_combined_path = os.path.join(settings.BASE_DIR, 'cache', 'charts_json', f"{hotel_name}_charts.json")
+    _require_hotel_name(hotel_name)
+    processed_path = storage.processed_path(hotel_name)
+    charts_json, version = storage.read_current_charts(hotel_name)
+    approximate = charts_json.get('approximate') if charts_json else None
 
-    if not os.path.exists(processed_path):
+    if not approximate and not os.path.exists(processed_path):
         return render(request, 'analysis/result.html', {'error': 'No processed data found'})
 
-    with open(processed_path, encoding='utf-8') as f:
-        reviews = json.load(f)
-
-    if os.path.exists(charts_combined_path):
-        with open(charts_combined_path, encoding='utf-8') as f:
-            charts_json = json.load(f)
-    else:
-        print(f"[WARNING] charts JSON not found for {hotel_name}, re-running pipeline...")
-        from analyze import run_pipeline
-        run_pipeline(hotel_name)
-        # After rerun, try loading again:
-        if os.path.exists(charts_combined_path):
-            with open(charts_combined_path, encoding='utf-8') as f:
-                charts_json = json.load(f)
-        else:
+    if charts_json is None:
+        # Re-check under the hotel lock: another worker may be mid-pipeline
+        with storage.hotel_lock(hotel_name):
+            charts_json, version = storage.read_current_charts(hotel_name)
+            if charts_json is None:
+                print(f"[WARNING] charts JSON not found for {hotel_name}, re-running pipeline...")
+                run_pipeline(hotel_name)
+                # After rerun, try loading again:
+                charts_json, version = storage.read_current_charts(hotel_name)
+        if charts_json is None:
             charts_json = {}
 
+    # Charts published before the count was stored: count the reviews
+    review_count = charts_json.get('review_count')
+    if review_count is None:
+        review_count = count_processed(hotel_name)
+
+    # Versions without key phrases have no wordcloud to render
+    wordcloud_urls = None
+    if version and os.path.exists(storage.keyphrases_path(hotel_name, version)):
+        wordcloud_urls = {
+            f"{size}_{fmt}": reverse('wordcloud', args=[hotel_name, version, size, fmt])
+            for size in wordclouds.SIZES for fmt in wordclouds.FORMATS
+        }
+
     return render(request, 'analysis/result.html', {
         'hotel_name': hotel_name.replace('_', ' '),
-        'review_count': len(reviews),
+        'hotel_slug': hotel_name,
+        'review_count': review_count,
+        'approximate': approximate,
         'charts': json.dumps(charts_json),  # important: make sure it's a JSON string for template
-        'tags_wordcloud': f"/charts/{hotel_name}_tags_wordcloud.png"
+        'wordcloud': wordcloud_urls,
+        'tags_wordcloud': f"{settings.MEDIA_URL}{hotel_name}_tags_wordcloud.png"
     })
+
+
+# Word frequencies for a published charts version, or None
+def _wordcloud_frequencies(hotel_name, version):
+    if not storage.is_valid_hotel_name(hotel_name) or not version.isalnum():
+        return None
+    return storage.read_json(storage.keyphrases_path(hotel_name, version))
+
+
+def _wordcloud_etag(request, hotel_name, version, size, fmt):
+    if size not in wordclouds.SIZES or fmt not in wordclouds.FORMATS:
+        return None
+    frequencies = _wordcloud_frequencies(hotel_name, version)
+    if not frequencies:
+        return None
+    return wordclouds.content_hash(frequencies, size, fmt)
+
+
+# Versioned URLs never change content, so they can be cached for a year
+@require_safe
+@cache_control(public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+@condition(etag_func=_wordcloud_etag)
+def wordcloud_image(request, hotel_name, version, size, fmt):
+    _require_hotel_name(hotel_name)
+    if size not in wordclouds.SIZES or fmt not in wordclouds.FORMATS:
+        raise Http404('Unknown wordcloud size or format')
+    frequencies = _wordcloud_frequencies(hotel_name, version)
+    if not frequencies:
+        raise Http404('No key phrases for this version')
+
+    path = wordclouds.get_or_render(frequencies, size, fmt)
+    return FileResponse(open(path, 'rb'), content_type=wordclouds.FORMATS[fmt][1])
@@ -3,33 +3,51 @@ import json
 import boto3
 from collections import Counter
 import pandas as pd
-from wordcloud import WordCloud
 from datetime import datetime
 import plotly.graph_objects as go
 import plotly.express as px
 import plotly
 import plotly.utils
 
+import sampling
+import storage
+import wordclouds
+import reviews as review_records
+from reviews import reviews_to_dicts
 
 
 # Initialize AWS Comprehend client
 comprehend = boto3.client('comprehend')
 
+SENTIMENTS = ['POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED']
 
-# Clean old chart files for hotel
+# Comprehend's batch_detect_* limit
+COMPREHEND_BATCH_SIZE = 25
+
+ENRICHED_FIELDS = ('sentiment', 'sentiment_scores', 'key_phrases')
+
+# Approximate mode defaults: stop once every sentiment share is known to
+# within +/- 3 percentage points (95% CI)
+APPROXIMATE_TARGET_ERROR = 0.03
+APPROXIMATE_INITIAL_SIZE = 300
+APPROXIMATE_BATCH_SIZE = 300
+
+
+# Clean old chart versions for hotel (the current one is never removed)
+# and rendered wordclouds nobody has requested for a while. Best effort:
+# a failed cleanup must not fail a run whose charts are already live.
 def clean_old_charts(hotel_name):
-    charts_dir = './cache/charts_json'
-    for chart_type in ['sentiment', 'trend', 'country', 'charts']:
-        path = os.path.join(charts_dir, f"{hotel_name}_{chart_type}.json")
-        if os.path.exists(path):
-            os.remove(path)
-            print(f"[INFO] Deleted old chart: {path}")
+    try:
+        storage.prune_versions(hotel_name)
+        wordclouds.prune_rendered()
+    except OSError as e:
+        print(f"[WARNING] Failed cleaning old charts for {hotel_name}: {e}")
 
 
 # Load reviews from JSON
 def load_reviews(hotel_name):
-    with open(f"./cache/{hotel_name}.json", encoding='utf-8') as f:
-        data = json.load(f)
+    with open(storage.raw_reviews_path(hotel_name), encoding='utf-8') as f:
+        data = review_records.load(f)
     return data['reviews']
 
 
@@ -49,27 +67,91 @@ def filter_reviews(reviews):
     return clean
 
 
-# Enrich with AWS
+# Enrich one review with the single-document Comprehend calls
+def enrich_review_with_aws(r):
+    text = r['text']
+    sent = comprehend.detect_sentiment(Text=text, LanguageCode='en')
+    r['sentiment'] = sent['Sentiment']
+    r['sentiment_scores'] = sent['SentimentScore']
+
+    phrases = comprehend.detect_key_phrases(Text=text, LanguageCode='en')
+    r['key_phrases'] = [p['Text'] for p in phrases['KeyPhrases']]
+    return r
+
+
+# Enrich with AWS, COMPREHEND_BATCH_SIZE reviews per call
 def enrich_reviews_with_aws(reviews):
-    enriched = []
-    for r in reviews:
-        text = r['text']
-        sent = comprehend.detect_sentiment(Text=text, LanguageCode='en')
-        r['sentiment'] = sent['Sentiment']
-        r['sentiment_scores'] = sent['SentimentScore']
-        
-        phrases = comprehend.detect_key_phrases(Text=text, LanguageCode='en')
-        r['key_phrases'] = [p['Text'] for p in phrases['KeyPhrases']]
-        
-        enriched.append(r)
+    enriched = list(reviews)
+    for start in range(0, len(enriched), COMPREHEND_BATCH_SIZE):
+        batch = enriched[start:start + COMPREHEND_BATCH_SIZE]
+        texts = [r['text'] for r in batch]
+
+        sent = comprehend.batch_detect_sentiment(TextList=texts, LanguageCode='en')
+        for item in sent['ResultList']:
+            r = batch[item['Index']]
+            r['sentiment'] = item['Sentiment']
+            r['sentiment_scores'] = item['SentimentScore']
+
+        phrases = comprehend.batch_detect_key_phrases(TextList=texts, LanguageCode='en')
+        for item in phrases['ResultList']:
+            batch[item['Index']]['key_phrases'] = [p['Text'] for p in item['KeyPhrases']]
+
+        # Documents rejected by a batch call are retried one at a time
+        failed = {e['Index'] for e in sent['ErrorList']} | {e['Index'] for e in phrases['ErrorList']}
+        for index in sorted(failed):
+            enrich_review_with_aws(batch[index])
     return enriched
 
 
+# Identify a review across scrapes, for reusing earlier enrichment
+def review_key(review):
+    return review.get('user_name', ''), review.get('date', ''), review.get('text', '')
+
+
+# Enrich only the reviews that were not already enriched in a sampled run
+def enrich_reviews_cached(reviews, known):
+    missing = []
+    for r in reviews:
+        previous = known.get(review_key(r))
+        if previous is None:
+            missing.append(r)
+            continue
+        for field in ENRICHED_FIELDS:
+            if field in previous:
+                r[field] = previous[field]
+    if missing:
+        enrich_reviews_with_aws(missing)
+    print(f"[INFO] Enriched {len(missing)} reviews, reused {len(reviews) - len(missing)}.")
+    return reviews
+
+
+# Save / load the enriched sample of an approximate run
+def save_sample(hotel_name, reviews):
+    storage.atomic_write_json(storage.sample_path(hotel_name), reviews_to_dicts(reviews), indent=2)
+
+
+def load_sample_index(hotel_name):
+    path = storage.sample_path(hotel_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return {review_key(r): r for r in review_records.load(f)}
+
+
 # Save processed reviews
 def save_processed(hotel_name, reviews):
-    os.makedirs('./cache/processed', exist_ok=True)
-    with open(f'./cache/processed/{hotel_name}_aws_processed.json', 'w', encoding='utf-8') as f:
-        json.dump(reviews, f, ensure_ascii=False, indent=2)
+    storage.atomic_write_json(storage.processed_path(hotel_name), reviews_to_dicts(reviews), indent=2)
+
+
+# Load processed reviews as compact records
+def load_processed(hotel_name):
+    with open(storage.processed_path(hotel_name), encoding='utf-8') as f:
+        return review_records.load(f)
+
+
+def count_processed(hotel_name):
+    with open(storage.processed_path(hotel_name), encoding='utf-8') as f:
+        return review_records.count(f)
 
 
 # Safely save plotly figure to JSON
@@ -79,9 +161,7 @@ def save_plotly_figure_json(fig, path):
         print(f"[WARNING] Not saving: figure is None for {path}")
         return
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(fig.to_plotly_json(), f, cls=plotly.utils.PlotlyJSONEncoder)
+        storage.atomic_write_json(path, fig.to_plotly_json(), cls=plotly.utils.PlotlyJSONEncoder)
         print(f"[INFO] Saved chart JSON: {path}")
     except Exception as e:
         print(f"[ERROR] Failed saving JSON for {path}: {e}")
@@ -89,7 +169,7 @@ def save_plotly_figure_json(fig, path):
 
 
 # Sentiment Pie Chart
-def plot_sentiment_pie(hotel_name, reviews):
+def plot_sentiment_pie(hotel_name, reviews, version):
     sentiments = Counter(r['sentiment'] for r in reviews)
     if not sentiments:
         print(f"[WARNING] No sentiment data for {hotel_name}")
@@ -99,7 +179,7 @@ def plot_sentiment_pie(hotel_name, reviews):
     fig = go.Figure(data=[go.Pie(labels=labels, values=sizes, hole=0.3)])
     fig.update_layout(title=f"Sentiment Distribution - {hotel_name}")
     
-    save_plotly_figure_json(fig, f'cache/charts_json/{hotel_name}_sentiment.json')
+    save_plotly_figure_json(fig, storage.chart_json_path(hotel_name, version, 'sentiment'))
 
 
 # Parse review date
@@ -111,7 +191,7 @@ def parse_review_date(date_str):
 
 
 # Rating Trend Chart
-def plot_rating_trend(hotel_name, reviews):
+def plot_rating_trend(hotel_name, reviews, version):
     data = []
     for r in reviews:
         date_obj = parse_review_date(r.get('date', ''))
@@ -144,11 +224,11 @@ def plot_rating_trend(hotel_name, reviews):
     )
     fig.update_layout(xaxis=dict(tickformat='%b %Y'))
 
-    save_plotly_figure_json(fig, f'cache/charts_json/{hotel_name}_trend.json')
+    save_plotly_figure_json(fig, storage.chart_json_path(hotel_name, version, 'trend'))
 
 
 # Country Distribution Chart
-def plot_country_distribution(hotel_name, reviews):
+def plot_country_distribution(hotel_name, reviews, version):
     countries = [r.get('user_country') for r in reviews if r.get('user_country')]
     if not countries:
         print(f"[WARNING] No country data for {hotel_name}")
@@ -170,52 +250,113 @@ def plot_country_distribution(hotel_name, reviews):
     )
     fig.update_layout(xaxis_tickangle=-45)
 
-    save_plotly_figure_json(fig, f'cache/charts_json/{hotel_name}_country.json')
+    save_plotly_figure_json(fig, storage.chart_json_path(hotel_name, version, 'country'))
 
 
 # WordCloud for Key Phrases
-def plot_keyphrase_wordcloud(hotel_name, reviews):
+def plot_keyphrase_wordcloud(hotel_name, reviews, version):
     all_phrases = []
     for r in reviews:
         all_phrases.extend(r.get('key_phrases', []))
-    text = ' '.join(all_phrases)
+    frequencies = wordclouds.phrase_frequencies(all_phrases)
 
-    if not text.strip():
+    if not frequencies:
         print(f"[WARNING] No key phrases for {hotel_name}")
         return
 
-    os.makedirs('charts', exist_ok=True)
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
-    wordcloud.to_file(f'charts/{hotel_name}_tags_wordcloud.png')
-    print(f"[INFO] Saved wordcloud image.")
+    save_wordcloud_frequencies(hotel_name, frequencies, version)
 
 
-# Main Pipeline
-def run_pipeline(hotel_name):
-    clean_old_charts(hotel_name)
+# Images are rendered on demand by the wordcloud view; only the
+# frequencies are stored here. Warm the thumbnail in the background.
+def save_wordcloud_frequencies(hotel_name, frequencies, version):
+    storage.atomic_write_json(storage.keyphrases_path(hotel_name, version), frequencies)
+    wordclouds.submit(frequencies, 'thumb', 'webp')
+    print(f"[INFO] Saved wordcloud frequencies.")
 
-    raw = load_reviews(hotel_name)
-    clean = filter_reviews(raw)
-    print(f"[INFO] Loaded {len(clean)} reviews after cleaning.")
 
-    enriched = enrich_reviews_with_aws(clean)
-    save_processed(hotel_name, enriched)
-    print("[INFO] Processed and saved enriched reviews.")
+# Sentiment shares estimated from a stratified sample
+def estimate_sentiment(sample):
+    estimates = {}
+    for label in SENTIMENTS:
+        share, margin = sample.estimate_share(lambda r, label=label: r.get('sentiment') == label)
+        estimates[label] = {'share': share, 'margin': margin}
+    return estimates
 
-    # Generate charts
-    plot_sentiment_pie(hotel_name, enriched)
-    plot_rating_trend(hotel_name, enriched)
-    plot_country_distribution(hotel_name, enriched)
-    plot_keyphrase_wordcloud(hotel_name, enriched)
 
-    # Combine charts JSON
-    charts_dir = './cache/charts_json'
-    combined_path = os.path.join(charts_dir, f'{hotel_name}_charts.json')
-    os.makedirs(charts_dir, exist_ok=True)
+# Share of reviews mentioning each of the most common sampled key phrases
+def estimate_phrases(sample, top=15):
+    phrase_sets = {id(r): {p.lower() for p in r.get('key_phrases', ())} for r in sample.reviews()}
+    counts = Counter(p for phrases in phrase_sets.values() for p in phrases)
+
+    estimates = {}
+    for phrase, _ in counts.most_common(top):
+        share, margin = sample.estimate_share(lambda r, phrase=phrase: phrase in phrase_sets[id(r)])
+        estimates[phrase] = {'share': share, 'margin': margin}
+    return estimates
+
+
+# Wordcloud frequencies extrapolated from each stratum's sample
+def estimate_word_frequencies(sample):
+    totals = Counter()
+    for reviews, weight in sample.weighted_strata():
+        phrases = [p for r in reviews for p in r.get('key_phrases', ())]
+        for word, count in wordclouds.phrase_frequencies(phrases).items():
+            totals[word] += count * weight
+    # Whole counts keep the content hash (and rendered image) stable between
+    # refine rounds that barely change the extrapolation
+    return {word: round(count) for word, count in totals.items()}
+
+
+# Estimated Sentiment Pie Chart
+def plot_sentiment_estimate(hotel_name, estimates, sample, version):
+    labels = [label for label in SENTIMENTS if estimates[label]['share'] > 0]
+    if not labels:
+        print(f"[WARNING] No sentiment data for {hotel_name}")
+        return None
+
+    values = [estimates[label]['share'] * sample.total for label in labels]
+    text = [f"{estimates[label]['share']:.0%} ± {estimates[label]['margin']:.1%}" for label in labels]
+    fig = go.Figure(data=[go.Pie(
+        labels=labels, values=values, hole=0.3, text=text, textinfo='label+text',
+        hovertemplate='%{label}: ~%{value:.0f} reviews<br>%{text}<extra></extra>',
+    )])
+    fig.update_layout(
+        title=f"Sentiment Distribution - {hotel_name} (estimated from {sample.size} of {sample.total} reviews, 95% CI)"
+    )
+
+    save_plotly_figure_json(fig, storage.chart_json_path(hotel_name, version, 'sentiment'))
+
+
+# Estimated Key Phrase Chart
+def plot_phrase_estimate(hotel_name, estimates, sample, version):
+    if not estimates:
+        print(f"[WARNING] No key phrases for {hotel_name}")
+        return None
+
+    phrases = sorted(estimates, key=lambda p: estimates[p]['share'], reverse=True)
+    fig = go.Figure(data=[go.Bar(
+        x=[estimates[p]['share'] * 100 for p in phrases],
+        y=phrases,
+        orientation='h',
+        error_x=dict(type='data', array=[estimates[p]['margin'] * 100 for p in phrases]),
+    )])
+    fig.update_layout(
+        title=f"Top Key Phrases - {hotel_name} (estimated from {sample.size} of {sample.total} reviews, 95% CI)",
+        xaxis_title='% of Reviews',
+        yaxis=dict(autorange='reversed'),
+    )
+
+    save_plotly_figure_json(fig, storage.chart_json_path(hotel_name, version, 'phrases'))
+
+
+# Combine chart JSONs of a version and make it the current one
+def combine_and_publish(hotel_name, version, chart_types, extra=None):
+    combined_path = storage.chart_json_path(hotel_name, version, 'charts')
 
     combined_data = {}
-    for chart_type in ['sentiment', 'trend', 'country']:
-        chart_file = os.path.join(charts_dir, f'{hotel_name}_{chart_type}.json')
+    for chart_type in chart_types:
+        chart_file = storage.chart_json_path(hotel_name, version, chart_type)
         if os.path.exists(chart_file):
             try:
                 with open(chart_file, encoding='utf-8') as f:
@@ -227,9 +368,137 @@ def run_pipeline(hotel_name):
 
     if not combined_data:
         print(f"[WARNING] No chart JSON generated for {hotel_name}")
+    if extra:
+        combined_data.update(extra)
 
-    with open(combined_path, 'w', encoding='utf-8') as f:
-        json.dump(combined_data, f, ensure_ascii=False, indent=2)
+    storage.atomic_write_json(combined_path, combined_data, indent=2)
+
+    # Readers switch to the new version only once everything is on disk
+    storage.publish_version(hotel_name, version)
 
     print("[INFO] Charts generated and combined JSON saved.")
     return combined_data
+
+
+# Main Pipeline
+#
+# approximate=True enriches a stratified sample (by review period and score
+# band) instead of every review, publishes charts with 95% confidence
+# intervals, and keeps topping the sample up by batch_size until every
+# sentiment share is within target_error or max_rounds top-ups have run
+# (max_rounds=0 gives a quick first pass). A later full run reuses the
+# sample's enrichment.
+def run_pipeline(hotel_name, approximate=False, target_error=APPROXIMATE_TARGET_ERROR,
+                 initial_size=APPROXIMATE_INITIAL_SIZE, batch_size=APPROXIMATE_BATCH_SIZE, max_rounds=None):
+    if approximate:
+        return _run_approximate(hotel_name, target_error, initial_size, batch_size, max_rounds)
+    with storage.hotel_lock(hotel_name):
+        return _run_pipeline_locked(hotel_name)
+
+
+def _run_pipeline_locked(hotel_name):
+    raw = load_reviews(hotel_name)
+    clean = filter_reviews(raw)
+    print(f"[INFO] Loaded {len(clean)} reviews after cleaning.")
+
+    enriched = enrich_reviews_cached(clean, load_sample_index(hotel_name))
+
+    # Charts are published before the processed file appears, so any reader
+    # that sees the processed file also finds a current charts version
+    combined_data = _publish_exact_charts(hotel_name, enriched)
+    save_processed(hotel_name, enriched)
+    print("[INFO] Processed and saved enriched reviews.")
+    clean_old_charts(hotel_name)
+    return combined_data
+
+
+def _publish_exact_charts(hotel_name, enriched):
+    version = storage.new_version()
+
+    # Generate charts into a fresh version directory
+    plot_sentiment_pie(hotel_name, enriched, version)
+    plot_rating_trend(hotel_name, enriched, version)
+    plot_country_distribution(hotel_name, enriched, version)
+    plot_keyphrase_wordcloud(hotel_name, enriched, version)
+
+    return combine_and_publish(hotel_name, version, ['sentiment', 'trend', 'country'],
+                               extra={'review_count': len(enriched)})
+
+
+# The hotel lock is taken per round rather than for the whole run, so a
+# full run or a new scrape of the hotel waits for one round at most, and
+# the next round stops once the hotel has been fully enriched
+def _run_approximate(hotel_name, target_error, initial_size, batch_size, max_rounds):
+    size = initial_size
+    rounds = 0
+    while True:
+        with storage.hotel_lock(hotel_name):
+            combined_data, margin, sampled = _run_approximate_round(hotel_name, size, initial_size)
+        if margin is None or margin <= target_error or (max_rounds is not None and rounds >= max_rounds):
+            return combined_data
+        size = sampled + batch_size
+        rounds += 1
+
+
+# One round: redraw the sample up to size, enrich the reviews not enriched
+# before and publish. Returns the charts, the largest sentiment margin (None
+# once there is nothing left to refine) and the sample size.
+def _run_approximate_round(hotel_name, size, initial_size):
+    if os.path.exists(storage.processed_path(hotel_name)):
+        print(f"[INFO] {hotel_name} is already fully enriched, stopping approximate run.")
+        return storage.read_current_charts(hotel_name)[0], None, 0
+
+    raw = load_reviews(hotel_name)
+    clean = filter_reviews(raw)
+    print(f"[INFO] Loaded {len(clean)} reviews after cleaning.")
+
+    # The sample is seeded and stratified for the same budget each time, so
+    # redrawing as many reviews as earlier rounds and runs picks the same
+    # ones first and their enrichment is reused
+    known = load_sample_index(hotel_name)
+    sample = sampling.StratifiedSample(clean, budget=initial_size)
+    batch = sample.draw(max(size, len(known)))
+    fresh = sum(1 for r in batch if review_key(r) not in known)
+    enrich_reviews_cached(batch, known)
+    if fresh:
+        save_sample(hotel_name, sample.reviews())
+
+    if sample.exhausted:
+        print("[INFO] Sample covers every review, publishing exact charts.")
+        combined_data = _publish_exact_charts(hotel_name, clean)
+        save_processed(hotel_name, clean)
+        clean_old_charts(hotel_name)
+        return combined_data, None, sample.size
+
+    sentiment = estimate_sentiment(sample)
+    margin = max(e['margin'] for e in sentiment.values())
+    print(f"[INFO] Sampled {sample.size} of {sample.total} reviews, sentiment margin ±{margin:.1%}")
+
+    # Nothing newly sampled means the current version already shows these estimates
+    current = storage.read_current_charts(hotel_name)[0]
+    if not fresh and current and (current.get('approximate') or {}).get('sampled') == sample.size:
+        print("[INFO] No new reviews sampled, keeping the current charts version.")
+        return current, margin, sample.size
+
+    combined_data = _publish_approximate_charts(hotel_name, clean, sample, sentiment, margin)
+    clean_old_charts(hotel_name)
+    return combined_data, margin, sample.size
+
+
+def _publish_approximate_charts(hotel_name, clean, sample, sentiment, margin):
+    version = storage.new_version()
+    plot_sentiment_estimate(hotel_name, sentiment, sample, version)
+    plot_rating_trend(hotel_name, clean, version)
+    plot_country_distribution(hotel_name, clean, version)
+    plot_phrase_estimate(hotel_name, estimate_phrases(sample), sample, version)
+    frequencies = estimate_word_frequencies(sample)
+    if frequencies:
+        save_wordcloud_frequencies(hotel_name, frequencies, version)
+
+    return combine_and_publish(
+        hotel_name, version, ['sentiment', 'trend', 'country', 'phrases'],
+        extra={
+            'review_count': sample.total,
+            'approximate': {'sampled': sample.size, 'total': sample.total, 'margin': margin},
+        },
+    )
@@ -0,0 +1,100 @@
+import os
+import sys
+import gc
+import json
+import random
+import tempfile
+import tracemalloc
+
+import reviews as review_records
+from reviews import reviews_to_dicts
+
+
+# Memory benchmark: loading processed reviews as plain dicts vs Review records
+#
+# Usage: python bench_memory.py [N_REVIEWS]
+#
+# Writes a synthetic processed file in the format of save_processed(), with
+# free-text titles, unique review texts, Zipf-distributed key phrases from a
+# large vocabulary (plus a share of one-off phrases) and realistic spreads
+# of countries, months and scores. It then measures json.load() against
+# reviews.load(), which is what load_processed() calls.
+
+PHRASE_VOCABULARY = 50_000
+UNIQUE_PHRASE_RATE = 0.2
+WORDS = [f"w{i}" for i in range(5_000)]
+COUNTRIES = [f"Country {i}" for i in range(120)]
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+SCORES = ['10', '9.0', '8.0', '7.0', '6.0', '5.0', '4.0', '3.0', '2.0', '1.0']
+SENTIMENTS = ['POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED']
+
+
+def synthetic_review(rng, i):
+    phrases = []
+    for _ in range(rng.randint(2, 10)):
+        if rng.random() < UNIQUE_PHRASE_RATE:
+            phrases.append(f"the {rng.choice(WORDS)} {rng.choice(WORDS)} {i}")
+        else:
+            rank = min(int(rng.paretovariate(1.1)), PHRASE_VOCABULARY)
+            phrases.append(f"phrase {rank}")
+    scores = [rng.random() for _ in range(4)]
+    total = sum(scores)
+    return {
+        'score': rng.choice(SCORES),
+        'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))),
+        'date': f"{rng.choice(MONTHS)} {rng.randint(2019, 2025)}",
+        'user_name': f"user{rng.randint(1, 200_000)}",
+        'user_country': rng.choice(COUNTRIES),
+        'text': f"review {i}: " + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))),
+        'lang': rng.choice(['en', 'en-us']),
+        'sentiment': rng.choice(SENTIMENTS),
+        'sentiment_scores': dict(zip(['Positive', 'Negative', 'Neutral', 'Mixed'], (s / total for s in scores))),
+        'key_phrases': phrases,
+    }
+
+
+def write_processed_file(path, n):
+    rng = random.Random(0)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([synthetic_review(rng, i) for i in range(n)], f, ensure_ascii=False, indent=2)
+
+
+def measure(load, path):
+    gc.collect()
+    tracemalloc.start()
+    with open(path, encoding='utf-8') as f:
+        data = load(f)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current, peak
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    fd, path = tempfile.mkstemp(suffix='_aws_processed.json')
+    os.close(fd)
+    try:
+        write_processed_file(path, n)
+        print(f"[INFO] Synthetic processed file: {n} reviews, {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        dicts, dict_bytes, dict_peak = measure(json.load, path)
+        expected = dicts[:1000]
+        del dicts
+
+        compact, compact_bytes, compact_peak = measure(review_records.load, path)
+        assert reviews_to_dicts(compact[:len(expected)]) == expected, "round trip mismatch"
+        del compact
+    finally:
+        os.remove(path)
+
+    print(f"{'form':<10}{'retained MiB':>14}{'peak MiB':>12}{'bytes/review':>15}")
+    for name, retained, peak in [('dict', dict_bytes, dict_peak), ('compact', compact_bytes, compact_peak)]:
+        print(f"{name:<10}{retained / 2**20:>14.1f}{peak / 2**20:>12.1f}{retained / n:>15.0f}")
+    print(f"[INFO] Compact form retains {compact_bytes / dict_bytes:.0%} and peaks at "
+          f"{compact_peak / dict_peak:.0%} of the dict form")
+
+
+if __name__ == '__main__':
+    main()
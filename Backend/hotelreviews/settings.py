@@ -125,3 +125,13 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Worker threads used to render wordcloud images on demand (see wordclouds.py)
+
+WORDCLOUD_RENDER_WORKERS = 2
+
+# Review pages (10 reviews each) scraped per hotel by the index and loading
+# views. Scraping runs inside the request, about 2 seconds per page, so keep
+# this small; analyze large hotels with main.py --approximate --pages=N.
+
+SCRAPE_MAX_PAGES = 1
@@ -0,0 +1,422 @@
+import os
+import sys
+import json
+import math
+import time
+import re
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+import urllib.parse
+from http.cookies import SimpleCookie
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Load generator for the Django endpoints
+#
+# Usage:
+#   python loadtest.py --concurrency 8 --duration 30
+#   python loadtest.py --url http://127.0.0.1:8000 --hotels dado-s-inn-dorms --new-hotel-ratio 0 \
+#       --index-post-weight 0 --full-analysis-weight 0   # existing deployment, no new scrapes
+#
+# Without --url the app is started in-process on a threaded WSGI server, with
+# the Booking.com scraper and AWS Comprehend replaced by local stubs (with
+# configurable latency) and all cache output going to a temporary BASE_DIR.
+# Mixed traffic is then driven against index (GET, and POST which scrapes
+# and runs the pipeline inline), loading, result, the wordcloud images linked
+# from result pages (rendered on first request) and the full analysis POST,
+# and p50/p95/p99 latency, throughput and error rate are reported per endpoint.
+
+HOTEL_URL = 'https://www.booking.com/hotel/in/{}.html'
+
+COUNTRIES = ['India', 'United Kingdom', 'Germany', 'United States', 'France', 'Australia', 'Japan']
+PHRASES = [
+    'the staff', 'the location', 'the room', 'breakfast', 'the bathroom', 'a comfortable stay',
+    'the wifi', 'the view', 'value for money', 'the noise', 'the beds', 'the price',
+]
+# Wordcloud image URLs as linked from the result page
+WORDCLOUD_URL_RE = re.compile(r'/wordcloud/[\w-]+/\w+/[\w-]+\.\w+')
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+
+# Local stubs for the external services
+def fake_reviews(pagename, count):
+    rng = random.Random(pagename)
+    reviews = []
+    for _ in range(count):
+        score = rng.choice(['10', '9.0', '8.0', '7.0', '6.0', '4.0', '2.0'])
+        reviews.append({
+            'score': score,
+            'title': 'Exceptional' if float(score) >= 9 else 'Good',
+            'date': f"{rng.choice(MONTHS)} {rng.choice([2023, 2024, 2025])}",
+            'user_name': f"user{rng.randint(1, 10_000)}",
+            'user_country': rng.choice(COUNTRIES),
+            'text': ' '.join(rng.sample(PHRASES, 4)) + ' was fine overall.',
+            'lang': 'en',
+        })
+    return reviews
+
+
+class StubComprehend:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def detect_sentiment(self, Text, LanguageCode):
+        time.sleep(self.latency)
+        return self._sentiment(Text)
+
+    def _sentiment(self, text):
+        rng = random.Random(text)
+        scores = [rng.random() for _ in range(4)]
+        total = sum(scores)
+        labels = ['Positive', 'Negative', 'Neutral', 'Mixed']
+        score_map = {label: s / total for label, s in zip(labels, scores)}
+        return {
+            'Sentiment': max(score_map, key=score_map.get).upper(),
+            'SentimentScore': score_map,
+        }
+
+    def detect_key_phrases(self, Text, LanguageCode):
+        time.sleep(self.latency)
+        return {'KeyPhrases': self._key_phrases(Text)}
+
+    def _key_phrases(self, text):
+        return [{'Text': p} for p in PHRASES if p in text]
+
+    # Batch calls cost one round trip for up to 25 documents
+    def batch_detect_sentiment(self, TextList, LanguageCode):
+        time.sleep(self.latency)
+        results = [dict(self._sentiment(text), Index=i) for i, text in enumerate(TextList)]
+        return {'ResultList': results, 'ErrorList': []}
+
+    def batch_detect_key_phrases(self, TextList, LanguageCode):
+        time.sleep(self.latency)
+        results = [{'Index': i, 'KeyPhrases': self._key_phrases(text)} for i, text in enumerate(TextList)]
+        return {'ResultList': results, 'ErrorList': []}
+
+
+def install_stubs(args):
+    import scrap
+    import analyze
+
+    def get_hotel_metadata(hotel_url):
+        time.sleep(args.scrape_latency)
+        return {'url': hotel_url, 'title': scrap.extract_pagename(hotel_url), 'address': '', 'description': ''}
+
+    def scrape_all_reviews(hotel_url, delay_seconds=2, max_pages=100):
+        time.sleep(args.scrape_latency * max_pages)
+        return fake_reviews(scrap.extract_pagename(hotel_url), args.reviews_per_hotel)
+
+    scrap.get_hotel_metadata = get_hotel_metadata
+    scrap.scrape_all_reviews = scrape_all_reviews
+    analyze.comprehend = StubComprehend(args.comprehend_latency)
+
+
+# In-process server
+def start_local_server(args):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotelreviews.settings')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    import django
+    from django.conf import settings
+    django.setup()
+
+    base_dir = tempfile.mkdtemp(prefix='loadtest-')
+    settings.BASE_DIR = base_dir
+    settings.MEDIA_ROOT = os.path.join(base_dir, 'charts')
+    settings.ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+    print(f"[INFO] Cache directory: {base_dir}")
+
+    install_stubs(args)
+
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *log_args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', args.port), QuietHandler)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+# Traffic
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, latency, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status] += 1
+            if status == 'exception' or status >= 500:
+                self.errors[endpoint] += 1
+
+
+def request(base_url, path, timeout, method='GET', body=None, headers=None):
+    parsed = urllib.parse.urlparse(base_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, response.getheader('Set-Cookie'), body
+    finally:
+        conn.close()
+
+
+# CSRF cookie set by rendering the index form, needed for the index POST
+def fetch_csrf_token(base_url, timeout):
+    _, set_cookie, _ = request(base_url, '/', timeout)
+    cookie = SimpleCookie(set_cookie or '')
+    return cookie['csrftoken'].value if 'csrftoken' in cookie else ''
+
+
+def post_headers(csrf_token):
+    return {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Cookie': f"csrftoken={csrf_token}",
+        'X-CSRFToken': csrf_token,
+    }
+
+
+class TrafficMix:
+    def __init__(self, args, warm_hotels, cold_hotels):
+        self.args = args
+        self.lock = threading.Lock()
+        self.known = list(warm_hotels) + list(cold_hotels)
+        self.counter = 0
+        self.wordcloud_urls = []
+        self.weights = {
+            'index': args.index_weight,
+            'index_post': args.index_post_weight,
+            'loading': args.loading_weight,
+            'result': args.result_weight,
+            'wordcloud': args.wordcloud_weight,
+            'full_analysis': args.full_analysis_weight,
+        }
+
+    # A hotel analyzed before, or (new_hotel_ratio of the time) a new one
+    def _pick_hotel(self, rng):
+        with self.lock:
+            if not self.known or rng.random() < self.args.new_hotel_ratio:
+                self.counter += 1
+                hotel = f"loadtest-new-{os.getpid()}-{self.counter}"
+                self.known.append(hotel)
+                return hotel
+            return rng.choice(self.known)
+
+    def _pick_known(self, rng):
+        with self.lock:
+            return rng.choice(self.known) if self.known else 'missing-hotel'
+
+    # Remember the wordcloud images a result page links to, as a browser
+    # would request them next
+    def observe(self, endpoint, status, body):
+        if endpoint != 'result' or status != 200:
+            return
+        urls = set(WORDCLOUD_URL_RE.findall(body.decode('utf-8', 'replace')))
+        with self.lock:
+            self.wordcloud_urls.extend(urls.difference(self.wordcloud_urls))
+
+    # (endpoint, method, path, form body)
+    def next_request(self, rng):
+        endpoint = rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        if endpoint == 'index':
+            return endpoint, 'GET', '/', None
+        if endpoint == 'index_post':
+            # The index POST always scrapes and runs the pipeline inline
+            body = urllib.parse.urlencode({'hotel_url': HOTEL_URL.format(self._pick_hotel(rng))})
+            return endpoint, 'POST', '/', body
+        if endpoint == 'loading':
+            query = urllib.parse.urlencode({'hotel_url': HOTEL_URL.format(self._pick_hotel(rng))})
+            return endpoint, 'GET', f"/loading/?{query}", None
+        if endpoint == 'wordcloud':
+            with self.lock:
+                url = rng.choice(self.wordcloud_urls) if self.wordcloud_urls else None
+            # No result page seen yet: load one, which links the images
+            if url is not None:
+                return endpoint, 'GET', url, None
+            endpoint = 'result'
+        if endpoint == 'full_analysis':
+            # Runs the full pipeline only for hotels with approximate charts
+            return endpoint, 'POST', f"/result/{self._pick_known(rng)}/full/", ''
+        return endpoint, 'GET', f"/result/{self._pick_known(rng)}/", None
+
+
+def seed_hotels(args):
+    import scrap
+    import analyze
+    import storage
+
+    warm = [f"loadtest-warm-{i}" for i in range(args.warm_hotels)]
+    cold = [f"loadtest-cold-{i}" for i in range(args.cold_hotels)]
+    for hotel in warm + cold:
+        scrap.scrape_hotel_reviews(HOTEL_URL.format(hotel), max_pages=1)
+        analyze.run_pipeline(hotel)
+    # Cold hotels keep their processed reviews but lose their charts, so the
+    # first result request for each re-runs the pipeline inline
+    for hotel in cold:
+        os.remove(os.path.join(storage.cache_path('charts_json', hotel), storage.CURRENT_POINTER))
+    return warm, cold
+
+
+def run_load(base_url, mix, args):
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+    issued = [0]
+    issued_lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        csrf_token = None
+        while time.monotonic() < deadline:
+            with issued_lock:
+                if args.requests and issued[0] >= args.requests:
+                    return
+                issued[0] += 1
+            endpoint, method, path, body = mix.next_request(rng)
+            headers = None
+            if method == 'POST':
+                if csrf_token is None:
+                    csrf_token = fetch_csrf_token(base_url, args.timeout)
+                headers = post_headers(csrf_token)
+            start = time.perf_counter()
+            try:
+                status, _, content = request(base_url, path, args.timeout, method, body, headers)
+            except Exception:
+                status, content = 'exception', b''
+            stats.record(endpoint, time.perf_counter() - start, status)
+            mix.observe(endpoint, status, content)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    return stats, time.perf_counter() - started
+
+
+# Reporting
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank method
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(stats, elapsed):
+    report = {}
+    all_latencies = []
+    for endpoint in sorted(stats.latencies):
+        values = sorted(stats.latencies[endpoint])
+        all_latencies.extend(values)
+        report[endpoint] = {
+            'requests': len(values),
+            'errors': stats.errors[endpoint],
+            'error_rate': stats.errors[endpoint] / len(values),
+            'throughput_rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000,
+            'statuses': {str(k): v for k, v in stats.statuses[endpoint].items()},
+        }
+    all_latencies.sort()
+    total_errors = sum(stats.errors.values())
+    report['total'] = {
+        'requests': len(all_latencies),
+        'errors': total_errors,
+        'error_rate': total_errors / len(all_latencies) if all_latencies else 0.0,
+        'throughput_rps': len(all_latencies) / elapsed,
+        'p50_ms': percentile(all_latencies, 50) * 1000,
+        'p95_ms': percentile(all_latencies, 95) * 1000,
+        'p99_ms': percentile(all_latencies, 99) * 1000,
+        'max_ms': all_latencies[-1] * 1000 if all_latencies else 0.0,
+    }
+    return report
+
+
+def print_report(report, elapsed):
+    print(f"\n[INFO] Ran for {elapsed:.1f}s")
+    header = f"{'endpoint':<15}{'reqs':>8}{'err %':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for endpoint, row in report.items():
+        print(f"{endpoint:<15}{row['requests']:>8}{row['error_rate'] * 100:>8.1f}{row['throughput_rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the review analysis endpoints.')
+    parser.add_argument('--url', help='Target an already running server instead of starting one in-process')
+    parser.add_argument('--port', type=int, default=0, help='Port for the in-process server (default: random)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests (0 = no limit)')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--index-weight', type=float, default=1.0)
+    parser.add_argument('--index-post-weight', type=float, default=0.2,
+                        help='Weight of index form submissions (scrape + pipeline inline)')
+    parser.add_argument('--loading-weight', type=float, default=1.0)
+    parser.add_argument('--result-weight', type=float, default=4.0)
+    parser.add_argument('--wordcloud-weight', type=float, default=2.0,
+                        help='Weight of wordcloud image requests (URLs taken from result pages)')
+    parser.add_argument('--full-analysis-weight', type=float, default=0.1,
+                        help='Weight of "Run full analysis" form submissions')
+    parser.add_argument('--new-hotel-ratio', type=float, default=0.1,
+                        help='Share of loading requests and index form submissions for a hotel '
+                             'that has not been analyzed yet')
+    parser.add_argument('--warm-hotels', type=int, default=5)
+    parser.add_argument('--cold-hotels', type=int, default=2)
+    parser.add_argument('--no-seed', action='store_true', help='Skip seeding hotels before the run')
+    parser.add_argument('--hotels', default='',
+                        help='Comma-separated hotel names already analyzed on the target (use with --url)')
+    parser.add_argument('--reviews-per-hotel', type=int, default=50)
+    parser.add_argument('--scrape-latency', type=float, default=0.2, help='Stub scraper latency per page, seconds')
+    parser.add_argument('--comprehend-latency', type=float, default=0.005, help='Stub Comprehend latency per call, seconds')
+    parser.add_argument('--json', dest='json_path', help='Also write the report as JSON to this path')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        server, base_url = start_local_server(args)
+    print(f"[INFO] Target: {base_url}")
+
+    warm, cold = ([], []) if args.no_seed or args.url else seed_hotels(args)
+    warm += [h for h in args.hotels.split(',') if h]
+    mix = TrafficMix(args, warm, cold)
+
+    print(f"[INFO] Driving traffic: concurrency={args.concurrency}, duration={args.duration}s")
+    stats, elapsed = run_load(base_url, mix, args)
+    report = summarize(stats, elapsed)
+    print_report(report, elapsed)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'elapsed_s': elapsed, 'endpoints': report}, f, indent=2)
+        print(f"[INFO] Saved report: {args.json_path}")
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
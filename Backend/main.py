@@ -4,21 +4,27 @@ from analyze import run_pipeline
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python main.py <HOTEL_URL>")
+        print("Usage: python main.py <HOTEL_URL> [--approximate] [--pages=N]")
         return
 
     hotel_url = sys.argv[1]
+    approximate = '--approximate' in sys.argv[2:]
+    max_pages = 2  # adjust pages if needed, or pass --pages=N
+    for arg in sys.argv[2:]:
+        if arg.startswith('--pages='):
+            max_pages = int(arg.split('=', 1)[1])
     print(f"Hotel URL provided: {hotel_url}")
 
     # Step 1: Scrape
     print("\n[Step 1] Scraping hotel reviews...")
-    scrape_hotel_reviews(hotel_url, max_pages=2)  # adjust pages if needed
+    scrape_hotel_reviews(hotel_url, max_pages=max_pages)
 
-    # Determine hotel file name
-    pagename = extract_pagename(hotel_url).replace('-', ' ').title().replace(' ', '_')
+    # Determine hotel file name (the same one the web views use, so the
+    # results show up at /result/<pagename>/)
+    pagename = extract_pagename(hotel_url)
 
     print(f"\n[Step 2] Analyzing hotel reviews from file: {pagename}.json")
-    run_pipeline(pagename)
+    run_pipeline(pagename, approximate=approximate)
 
 if __name__ == "__main__":
     main()
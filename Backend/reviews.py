@@ -0,0 +1,166 @@
+import sys
+import json
+from array import array
+from types import MappingProxyType
+
+
+# Compact in-process review record
+#
+# Reviews are stored as __slots__ objects instead of dicts. Categorical
+# strings (score, date, country, language, sentiment) and key phrases are
+# interned so repeated values share one string object, and the four
+# Comprehend sentiment scores are packed into one array of doubles.
+# Review supports the dict-style access used by the pipeline (r['text'],
+# r.get('date', '')). For dicts loaded from our JSON files, to_dict()
+# returns a dict equal to the source; known fields come back in schema
+# order, and sentiment scores that are not all floats are kept unpacked.
+# Packed sentiment scores are read back as a read-only mapping, so
+# r['sentiment_scores']['Positive'] = x raises TypeError instead of
+# silently changing a copy; assign a whole new dict to r['sentiment_scores'].
+#
+# load() converts reviews while the JSON is parsed, so a full list of
+# dicts is never held alongside the records.
+
+SENTIMENT_LABELS = ('Positive', 'Negative', 'Neutral', 'Mixed')
+
+FIELDS = (
+    'score', 'title', 'date', 'user_name', 'user_country', 'text', 'lang',
+    'sentiment', 'sentiment_scores', 'key_phrases',
+)
+
+# Fields whose values repeat across reviews and are worth interning
+INTERNED_FIELDS = frozenset(('score', 'date', 'user_country', 'lang', 'sentiment'))
+
+# Keys that identify a review dict (raw or processed) inside a JSON document
+REVIEW_KEYS = frozenset(('score', 'date', 'text'))
+
+# Marks a field that was absent from the source dict, so it stays absent in to_dict()
+_MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def pack_sentiment_scores(scores):
+    if scores is None or scores is _MISSING:
+        return scores
+    if isinstance(scores, MappingProxyType):
+        scores = dict(scores)
+    if (isinstance(scores, dict) and list(scores) == list(SENTIMENT_LABELS)
+            and all(type(v) is float for v in scores.values())):
+        return array('d', (scores[label] for label in SENTIMENT_LABELS))
+    # Unexpected shape: keep as-is so the round trip stays lossless
+    return scores
+
+
+def unpack_sentiment_scores(scores):
+    if isinstance(scores, array):
+        return dict(zip(SENTIMENT_LABELS, scores))
+    return scores
+
+
+class Review:
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            setattr(self, name, _MISSING)
+        self.extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        data = {}
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is _MISSING:
+                continue
+            if name == 'sentiment_scores':
+                value = unpack_sentiment_scores(value)
+            elif name == 'key_phrases' and isinstance(value, tuple):
+                value = list(value)
+            data[name] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    # Dict-style access, so existing pipeline code works unchanged
+    def __getitem__(self, key):
+        if key in FIELDS:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            if key == 'sentiment_scores' and isinstance(value, array):
+                return MappingProxyType(unpack_sentiment_scores(value))
+            return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in INTERNED_FIELDS:
+            value = _intern(value)
+        elif key == 'sentiment_scores':
+            value = pack_sentiment_scores(value)
+        elif key == 'key_phrases' and isinstance(value, list):
+            value = tuple(_intern(p) for p in value)
+        elif key not in FIELDS:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+            return
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        if key in FIELDS:
+            return getattr(self, key) is not _MISSING
+        return bool(self.extra) and key in self.extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Review):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Review({self.to_dict()!r})"
+
+    # Pickle/copy through the dict form so the _MISSING sentinel survives
+    def __reduce__(self):
+        return Review.from_dict, (self.to_dict(),)
+
+
+def reviews_from_dicts(items):
+    return [Review.from_dict(item) for item in items]
+
+
+def reviews_to_dicts(reviews):
+    return [r.to_dict() if isinstance(r, Review) else r for r in reviews]
+
+
+def review_object_hook(data):
+    if REVIEW_KEYS <= data.keys():
+        return Review.from_dict(data)
+    return data
+
+
+# Parse a JSON document, turning every review dict into a Review as it is read
+def load(fp):
+    return json.load(fp, object_hook=review_object_hook)
+
+
+# Number of reviews in a JSON list of reviews, without keeping any of them
+def count(fp):
+    return len(json.load(fp, object_hook=lambda data: None if REVIEW_KEYS <= data.keys() else data))
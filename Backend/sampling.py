@@ -0,0 +1,172 @@
+import math
+import random
+from datetime import datetime
+from functools import lru_cache
+
+
+# Stratified sampling for approximate analysis
+#
+# Reviews are grouped into strata by review period and score band. The
+# period is the finest of month, quarter, year or none that still gives
+# every stratum MIN_PER_STRATUM reviews within the first draw's budget.
+# Each draw first fills strata round-robin (one review each, then a second),
+# then allocates proportionally to stratum size. Shares are estimated with
+# the stratified estimator and a normal-approximation confidence interval
+# including the finite population correction; strata that have not been
+# sampled yet are counted against the margin at their worst case instead
+# of being dropped. Because every stratum is shuffled with a fixed seed,
+# drawing again with the same seed and budget returns the same reviews in
+# the same order, so a sample can be topped up across runs.
+
+MIN_PER_STRATUM = 2
+
+Z_95 = 1.96
+
+SCORE_BANDS = (
+    ('low', 0.0, 5.0),
+    ('mid', 5.0, 8.0),
+    ('high', 8.0, math.inf),
+)
+
+GRANULARITIES = ('month', 'quarter', 'year', 'none')
+
+
+def score_band(score):
+    try:
+        value = float(score)
+    except (TypeError, ValueError):
+        return 'unknown'
+    for name, low, high in SCORE_BANDS:
+        if low <= value < high:
+            return name
+    return 'unknown'
+
+
+@lru_cache(maxsize=None)
+def review_year_month(date_str):
+    try:
+        date_obj = datetime.strptime(date_str.strip(), "%B %Y")
+    except ValueError:
+        return None
+    return date_obj.year, date_obj.month
+
+
+def review_period(year_month, granularity):
+    if granularity == 'none':
+        return 'all'
+    if year_month is None:
+        return 'unknown'
+    year, month = year_month
+    if granularity == 'month':
+        return f"{year}-{month:02d}"
+    if granularity == 'quarter':
+        return f"{year}-Q{(month - 1) // 3 + 1}"
+    return str(year)
+
+
+def stratum_key(review, granularity='month'):
+    year_month = review_year_month(review.get('date') or '')
+    return review_period(year_month, granularity), score_band(review.get('score'))
+
+
+class StratifiedSample:
+    def __init__(self, reviews, seed=0, budget=None):
+        self.total = len(reviews)
+        parsed = [
+            (r, review_year_month(r.get('date') or ''), score_band(r.get('score')))
+            for r in reviews
+        ]
+
+        # Finest granularity whose strata all get their floor within the budget
+        for granularity in GRANULARITIES:
+            keys = [(review_period(ym, granularity), band) for _, ym, band in parsed]
+            if budget is None or len(set(keys)) * MIN_PER_STRATUM <= budget:
+                break
+        self.granularity = granularity
+
+        self.strata = {}
+        for (r, _, _), key in zip(parsed, keys):
+            self.strata.setdefault(key, []).append(r)
+        self.keys = sorted(self.strata)
+        rng = random.Random(seed)
+        for key in self.keys:
+            rng.shuffle(self.strata[key])
+        self.drawn = {key: 0 for key in self.keys}
+
+    @property
+    def size(self):
+        return sum(self.drawn.values())
+
+    @property
+    def exhausted(self):
+        return self.size >= self.total
+
+    def sampled(self, key):
+        return self.strata[key][:self.drawn[key]]
+
+    def reviews(self):
+        return [r for key in self.keys for r in self.sampled(key)]
+
+    def _take(self, key):
+        review = self.strata[key][self.drawn[key]]
+        self.drawn[key] += 1
+        return review
+
+    # Draw up to n more reviews and return them
+    def draw(self, n):
+        new = []
+        # Round-robin floor: one review from every stratum, then a second,
+        # so no stratum is left out while the budget goes to a few of them
+        for level in range(1, MIN_PER_STRATUM + 1):
+            for key in self.keys:
+                if len(new) >= n:
+                    return new
+                if self.drawn[key] < min(level, len(self.strata[key])):
+                    new.append(self._take(key))
+
+        # Then proportional allocation: always top up the most under-sampled stratum
+        while len(new) < n and not self.exhausted:
+            target = self.size + 1
+            key = max(
+                (k for k in self.keys if self.drawn[k] < len(self.strata[k])),
+                key=lambda k: len(self.strata[k]) * target / self.total - self.drawn[k],
+            )
+            new.append(self._take(key))
+        return new
+
+    # Each sampled stratum as (sampled reviews, expansion weight N_h / n_h)
+    def weighted_strata(self):
+        for key in self.keys:
+            n_h = self.drawn[key]
+            if n_h:
+                yield self.sampled(key), len(self.strata[key]) / n_h
+
+    # Estimated share of all reviews matching predicate, with 95% CI half-width.
+    # Unsampled strata are imputed with the sampled estimate, and their whole
+    # weight times the worst-case error is added to the margin.
+    def estimate_share(self, predicate):
+        if not self.size:
+            return 0.0, 1.0
+
+        sampled_share = 0.0
+        sampled_weight = 0.0
+        variance = 0.0
+        for key in self.keys:
+            n_h = self.drawn[key]
+            if not n_h:
+                continue
+            N_h = len(self.strata[key])
+            weight = N_h / self.total
+            p_h = sum(1 for r in self.sampled(key) if predicate(r)) / n_h
+            sampled_share += weight * p_h
+            sampled_weight += weight
+            if n_h < N_h:
+                # Conservative worst-case variance for single-review strata
+                s2 = p_h * (1 - p_h) * n_h / (n_h - 1) if n_h > 1 else 0.25
+                variance += weight ** 2 * (1 - n_h / N_h) * s2 / n_h
+
+        unsampled_weight = max(0.0, 1.0 - sampled_weight)
+        imputed = sampled_share / sampled_weight
+        share = sampled_share + unsampled_weight * imputed
+        margin = Z_95 * math.sqrt(variance) + unsampled_weight * max(imputed, 1 - imputed)
+        return share, min(margin, 1.0)
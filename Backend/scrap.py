@@ -1,4 +1,3 @@
-import os
 import time
 import requests
 from parsel import Selector
@@ -6,6 +5,8 @@ import urllib.parse
 import re
 import json
 
+import storage
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
 }
@@ -93,15 +94,13 @@ def scrape_all_reviews(hotel_url, delay_seconds=2, max_pages=100):
     return all_reviews
 
 def save_to_cache(hotel_url, metadata, reviews):
-    os.makedirs('cache', exist_ok=True)
     hotel_name_safe = extract_pagename(hotel_url)  # <== FIXED!
-    filename = os.path.join('cache', f"{hotel_name_safe}.json")
+    filename = storage.raw_reviews_path(hotel_name_safe)
     data = {
         'metadata': metadata,
         'reviews': reviews
     }
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    storage.atomic_write_json(filename, data, indent=2)
     print(f"Saved data to {filename}")
 
 
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Number of published chart versions kept per hotel. Older versions are
+# pruned, but the previous ones stay around for readers that resolved the
+# "current" pointer just before a new version was published.
+KEEP_VERSIONS = 3
+
+# Older versions are also kept until they are this old, so result pages
+# that are still open (whose wordcloud URLs were served as immutable) keep
+# working while approximate runs publish a new version every refine round.
+# Rendered wordcloud images not served for this long are pruned as well.
+VERSION_RETENTION_SECONDS = 24 * 60 * 60
+
+CURRENT_POINTER = 'CURRENT'
+
+# Hotel names are Booking.com pagenames and become file names under cache/
+HOTEL_NAME_RE = re.compile(r'[\w-]+')
+
+# On Windows, os.replace() fails with PermissionError while another process
+# has the target open (e.g. a reader of charts.json), so it is retried
+REPLACE_RETRIES = 50
+REPLACE_RETRY_DELAY = 0.1
+
+_held_locks = threading.local()
+
+
+# Project root: settings.BASE_DIR under Django, the Backend directory otherwise
+def get_base_dir():
+    try:
+        from django.conf import settings
+        return str(settings.BASE_DIR)
+    except Exception:
+        return os.path.dirname(os.path.abspath(__file__))
+
+
+def is_valid_hotel_name(hotel_name):
+    return bool(hotel_name) and HOTEL_NAME_RE.fullmatch(hotel_name) is not None
+
+
+def cache_path(*parts):
+    return os.path.join(get_base_dir(), 'cache', *parts)
+
+
+def raw_reviews_path(hotel_name):
+    return cache_path(f"{hotel_name}.json")
+
+
+def processed_path(hotel_name):
+    return cache_path('processed', f"{hotel_name}_aws_processed.json")
+
+
+# Enriched sample of an approximate run (see sampling.py)
+def sample_path(hotel_name):
+    return cache_path('processed', f"{hotel_name}_aws_sample.json")
+
+
+# Write to a temp file in the target directory, then rename over the target
+def atomic_write_bytes(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _replace(src, dst):
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if fcntl is not None or attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(REPLACE_RETRY_DELAY)
+
+
+def atomic_write_json(path, data, **kwargs):
+    kwargs.setdefault('ensure_ascii', False)
+    atomic_write_bytes(path, json.dumps(data, **kwargs).encode('utf-8'))
+
+
+def read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Per-hotel advisory lock, re-entrant within a thread
+@contextmanager
+def hotel_lock(hotel_name):
+    held = getattr(_held_locks, 'names', None)
+    if held is None:
+        held = _held_locks.names = {}
+    if hotel_name in held:
+        held[hotel_name] += 1
+        try:
+            yield
+        finally:
+            held[hotel_name] -= 1
+        return
+
+    lock_file = cache_path('locks', f"{hotel_name}.lock")
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+    with open(lock_file, 'a+b') as f:
+        _lock_file(f)
+        held[hotel_name] = 1
+        try:
+            yield
+        finally:
+            del held[hotel_name]
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Block until the lock file is held exclusively
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    # LK_LOCK gives up with OSError after 10 one-second attempts; keep
+    # waiting so a long pipeline run blocks other requests like flock does
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+# Versioned chart artifacts
+#
+# Each pipeline run writes into a fresh version directory:
+#   cache/charts_json/<hotel>/<version>/<chart>.json
+# and only then flips cache/charts_json/<hotel>/CURRENT to point at it.
+def new_version():
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+
+
+def chart_json_path(hotel_name, version, chart_type):
+    return cache_path('charts_json', hotel_name, version, f"{chart_type}.json")
+
+
+def keyphrases_path(hotel_name, version):
+    return chart_json_path(hotel_name, version, 'keyphrases')
+
+
+# Rendered wordcloud images are content-addressed and shared across versions
+def rendered_wordcloud_path(digest, fmt):
+    return cache_path('wordclouds', f"{digest}.{fmt}")
+
+
+def get_current_version(hotel_name):
+    pointer = cache_path('charts_json', hotel_name, CURRENT_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, encoding='utf-8') as f:
+        version = f.read().strip()
+    return version or None
+
+
+def publish_version(hotel_name, version):
+    pointer = cache_path('charts_json', hotel_name, CURRENT_POINTER)
+    atomic_write_bytes(pointer, version.encode('utf-8'))
+    print(f"[INFO] Published charts version {version} for {hotel_name}")
+
+
+def prune_versions(hotel_name, keep=KEEP_VERSIONS, max_age=VERSION_RETENTION_SECONDS):
+    current = get_current_version(hotel_name)
+    now = time.time()
+    root = cache_path('charts_json', hotel_name)
+    if not os.path.isdir(root):
+        return
+    versions = sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name))
+    )
+    for version in versions[:-keep] if keep else versions:
+        path = os.path.join(root, version)
+        if version == current or now - os.path.getmtime(path) < max_age:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"[INFO] Deleted old charts version: {path}")
+
+
+# Combined charts and their version for the current version, or (None, None).
+# Falls back to the flat pre-versioning layout (version None) so existing
+# caches still load.
+def read_current_charts(hotel_name):
+    version = get_current_version(hotel_name)
+    if version:
+        charts = read_json(chart_json_path(hotel_name, version, 'charts'))
+        if charts is not None:
+            return charts, version
+
+    legacy = read_json(cache_path('charts_json', f"{hotel_name}_charts.json"))
+    if legacy is not None:
+        return legacy, None
+    return None, None
@@ -0,0 +1,136 @@
+import io
+import os
+import json
+import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from wordcloud import WordCloud
+
+import storage
+
+
+# On-demand wordcloud rendering
+#
+# The pipeline only stores word frequencies per charts version. Images are
+# rendered here on first request, in a small worker pool, and cached under
+# cache/wordclouds/ by a hash of their content (frequencies, size, format),
+# so repeat views and unchanged clouds across versions never re-render.
+
+SIZES = {
+    'thumb': (400, 200),
+    'full': (800, 400),
+}
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 6}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+}
+
+# Bump when rendering options change so old cached images are not reused
+RENDER_REVISION = 1
+
+DEFAULT_RENDER_WORKERS = 2
+
+_executor = None
+_inflight = {}
+_lock = threading.RLock()
+
+
+def get_render_workers():
+    try:
+        from django.conf import settings
+        return getattr(settings, 'WORDCLOUD_RENDER_WORKERS', DEFAULT_RENDER_WORKERS)
+    except Exception:
+        return DEFAULT_RENDER_WORKERS
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_render_workers(), thread_name_prefix='wordcloud')
+        return _executor
+
+
+# Word frequencies exactly as WordCloud.generate() would compute them from the phrases
+def phrase_frequencies(phrases):
+    text = ' '.join(phrases)
+    if not text.strip():
+        return {}
+    return WordCloud().process_text(text)
+
+
+def content_hash(frequencies, size, fmt):
+    payload = json.dumps(
+        {'frequencies': frequencies, 'size': SIZES[size], 'format': fmt, 'revision': RENDER_REVISION},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def render(frequencies, size, fmt):
+    width, height = SIZES[size]
+    pil_format, _, options = FORMATS[fmt]
+    wordcloud = WordCloud(width=width, height=height, background_color='white', random_state=0)
+    image = wordcloud.generate_from_frequencies(frequencies).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def _render_to_cache(frequencies, size, fmt, path):
+    storage.atomic_write_bytes(path, render(frequencies, size, fmt))
+    print(f"[INFO] Rendered wordcloud image: {path}")
+
+
+def _discard(digest):
+    with _lock:
+        _inflight.pop(digest, None)
+
+
+# Submit a render unless the image is cached or already being rendered
+def submit(frequencies, size, fmt):
+    digest = content_hash(frequencies, size, fmt)
+    path = storage.rendered_wordcloud_path(digest, fmt)
+    with _lock:
+        future = _inflight.get(digest)
+        if future is None and not os.path.exists(path):
+            future = _get_executor().submit(_render_to_cache, frequencies, size, fmt, path)
+            _inflight[digest] = future
+            future.add_done_callback(lambda _: _discard(digest))
+    return path, future
+
+
+# Path of the rendered image, rendering it in the pool if needed
+def get_or_render(frequencies, size, fmt):
+    path, future = submit(frequencies, size, fmt)
+    if future is not None:
+        future.result()
+        return path
+    try:
+        # Served images stay fresh, so prune_rendered() only drops unused ones
+        os.utime(path)
+    except FileNotFoundError:
+        return get_or_render(frequencies, size, fmt)
+    return path
+
+
+# Delete rendered images that have not been served for max_age seconds.
+# They are re-rendered on demand if a published version still needs them.
+def prune_rendered(max_age=storage.VERSION_RETENTION_SECONDS):
+    root = storage.cache_path('wordclouds')
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if now - os.path.getmtime(path) >= max_age:
+                os.remove(path)
+                print(f"[INFO] Deleted unused wordcloud image: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[WARNING] Failed deleting wordcloud image {path}: {e}")